@@ -1,4 +1,4 @@
-#!/usr/bin/env python
+#!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
 This script validates that each line of a given file contains valid
@@ -9,45 +9,187 @@ __date__   = "Fri Sep 16 11:06:32 2011"
 __version__ = "1.0.0.6"
 
 import sys
-import codecs
+import collections
+import itertools
+import multiprocessing
 from optparse import OptionParser
 try:
-    import simplejson as json
+    import orjson as json
 except ImportError:
-    import json
+    try:
+        import ujson as json
+    except ImportError:
+        try:
+            import simplejson as json
+        except ImportError:
+            import json
+try:
+    import jsonschema_rs
+except ImportError:
+    jsonschema_rs = None
 
-JSON_UNICODE_PROBLEMS = [u'\u2028', u'\u2029']
+# size of each read() from the input file
+READ_CHUNK_SIZE = 1 << 20
 
-def safe_file_reader(f): 
-    nextLine = ''
-    while True:
-        try:
-            nextLine = nextLine + f.next()
-        except StopIteration:
-            if nextLine:
-                yield nextLine
-            return
-        if nextLine[-1] in JSON_UNICODE_PROBLEMS:
-            continue
-        else:
-            yield nextLine
-            nextLine = ''
+# number of lines handed to a worker process at a time
+BLOCK_SIZE = 10000
+
+# messages reported for a line of the input file.  Errors are kept as
+# (template, line number, detail) until they are printed, see _format_error()
+INVALID_UTF8_ERROR = 'Line %d: Found invalid UTF-8 characters.  Check the encoding of the input file: %s'
+INVALID_JSON_ERROR = 'Line %d: Found invalid JSON: %s'
+SCHEMA_ERROR = 'Line %d: Found valid JSON which does not match expected schema:\n\t%s'
+
+# added in place of the rest of a line's schema errors once max_errors is reached
+MORE_ERRORS_NOTE = '... more errors omitted'
+
+REQUIRED_WARNING = '"%s" was required, but found an invalid entry of "%s"'
+
+def safe_file_reader(f, chunkSize=READ_CHUNK_SIZE):
+    """
+    Yield each line of the binary file f (without its newline), reading the
+    file in chunks of chunkSize bytes.  Only a line split across two chunks
+    is copied to stitch it back together
+    """
+    buf = bytearray()
+    for chunk in iter(lambda: f.read(chunkSize), b''):
+        lines = chunk.split(b'\n')
+        tail = lines.pop()
+        for line in lines:
+            if buf:
+                buf += line
+                yield bytes(buf)
+                buf.clear()
+            else:
+                yield line
+        buf += tail
+    if buf:
+        yield bytes(buf)
 
 def _indent(val, indent):
     return '\n' + (' ' * indent * 4) + val
 
 def valid_entry(field):
-    if type(field) == unicode:
-        return not field.strip() in [None, '']
+    # empty or all-whitespace strings are invalid; isspace() is False for ''
+    return not (isinstance(field, str) and (not field or field.isspace()))
+
+# JSON Schema equivalents of the plain types used in the field definitions.
+# int is mapped to "integer" even though strings holding an int are also
+# accepted: the JSON Schema only has to be as strict as the checkers
+JSON_SCHEMA_TYPES = {str: 'string', int: 'integer', bool: 'boolean'}
+
+# a string with at least one non-whitespace character, see valid_entry().
+# The regex \s doesn't cover everything isspace() does, hence the extras;
+# test_json_validator.py makes sure nothing blank gets through
+NON_BLANK_PATTERN = '[^\\s\\x1c-\\x1f\\x85]'
+
+def _value_schema(expectedValue, required):
+    """
+    Return a JSON Schema matching (a subset of) the values accepted for
+    expectedValue.  Values of a type with no JSON Schema equivalent never match
+    """
+    if isinstance(expectedValue, FieldChecker):
+        schema = expectedValue._to_jsonschema(required)
+    elif type(expectedValue) == object:
+        schema = {}
+    elif type(expectedValue) in JSON_SCHEMA_TYPES:
+        schema = {'type': JSON_SCHEMA_TYPES[type(expectedValue)]}
+    else:
+        schema = {'not': {}}
+    if required:
+        schema['pattern'] = NON_BLANK_PATTERN
+    return schema
+
+
+def _is_int(value):
+    if isinstance(value, int):
+        return True
+    #csv reader reads this as strings, try to convert to an int
+    try:
+        int(value)
+    except (TypeError, ValueError):
+        return False
     return True
 
+def _isinstance_checker(expectedType):
+    return lambda value: isinstance(value, expectedType)
 
-class Field(dict):
+# functions checking that a value has the expected type, by type
+_TYPE_CHECKERS = {
+    str: _isinstance_checker(str),
+    int: _is_int,
+    bool: _isinstance_checker(bool),
+}
 
-    def __init__(self, name, expectedValue, disallowedFields=[]):
-        self.name = name
+
+class Field(object):
+
+    __slots__ = ('name', 'expectedValue', 'disallowedFields', 'expectedType',
+                 'expectedTypeName', 'typeErrorPrefix', 'disallowedSet', 'checker')
+
+    def __init__(self, name, expectedValue, disallowedFields=None):
+        self.name = sys.intern(name)
         self.expectedValue = expectedValue
-        self.disallowedFields = disallowedFields
+        self.disallowedFields = disallowedFields or []
+
+        # invariants used when checking each candidate
+        self.expectedType = type(expectedValue)
+        self.expectedTypeName = self.expectedType.__name__
+        self.typeErrorPrefix = 'Field "%s" had incorrect type. Expected: "%s" but found: "%%s"' % \
+            (name, self.expectedTypeName)
+        self.disallowedSet = frozenset(self.disallowedFields)
+        self.checker = _TYPE_CHECKERS.get(self.expectedType) or \
+            _isinstance_checker(self.expectedType)
+
+    def __reduce__(self):
+        # everything else is derived from these (and checker can't be pickled)
+        return Field, (self.name, self.expectedValue, self.disallowedFields)
+
+
+class _ErrorLimit(Exception):
+    """
+    Raised by a compiled validator once it has found more errors than it
+    was allowed to
+    """
+
+
+class _SourceWriter(object):
+    """
+    Accumulates the source of a generated validation function, along with the
+    namespace holding the objects that the generated source refers to
+    """
+
+    def __init__(self):
+        self.lines = []
+        self.namespace = {}
+        self._count = 0
+
+    def line(self, depth, text):
+        self.lines.append('    ' * depth + text)
+
+    def local(self, prefix):
+        self._count += 1
+        return '%s%d' % (prefix, self._count)
+
+    def bind(self, obj):
+        name = self.local('_c')
+        self.namespace[name] = obj
+        return name
+
+    def error(self, depth, prefix, template, *args):
+        if args:
+            expr = '%r %% (%s,)' % (prefix.replace('%', '%%') + template, ', '.join(args))
+        else:
+            expr = repr(prefix + template)
+        self.line(depth, 'errors.append(' + expr + ')')
+        self.check_limit(depth)
+
+    def check_limit(self, depth):
+        self.line(depth, 'if len(errors) > limit:')
+        self.line(depth + 1, 'raise _ErrorLimit()')
+
+    def warning(self, depth, template, *args):
+        self.line(depth, 'warnings.append(%r %% (%s,))' % (template, ', '.join(args)))
 
 
 class FieldChecker(object):
@@ -76,11 +218,43 @@ class FieldChecker(object):
         """
         
         if not isinstance(candidate, self.topLevelType()):
-            return ['Expected type: "' + 
-                    self.topLevelType().__name__ + '", ' + 
-                    'but found type: "' + type(candidate).__name__ + '"'], []
+            return ['Expected type: "%s", but found type: "%s"' %
+                    (self.topLevelType().__name__, type(candidate).__name__)], []
         return self._validate(candidate, required)
 
+    def _to_jsonschema(self, required=False):
+        """
+        Return a JSON Schema that only matches candidates for which validate()
+        finds no errors and no warnings
+        """
+        raise NotImplementedError()
+
+    ######### Code Generation ##########
+
+    def _emit_type_check(self, w, var, prefix, depth):
+        """
+        Write the source for the top level type check done by validate(), and
+        return the depth at which the rest of the checks should be written
+        """
+        w.line(depth, 'if not isinstance(%s, %s):' % (var, w.bind(self.topLevelType())))
+        w.error(depth + 1, prefix,
+                'Expected type: "' + self.topLevelType().__name__ + '", but found type: "%s"',
+                'type(%s).__name__' % var)
+        w.line(depth, 'else:')
+        return depth + 1
+
+    def _emit(self, w, var, prefix, required, depth):
+        """
+        Write source that checks the value held in the variable named var,
+        appending errors (prefixed with prefix) and warnings to the lists
+        named errors and warnings.  By default this just calls validate()
+        """
+        errs, warns = w.local('errs'), w.local('warns')
+        w.line(depth, '%s, %s = %s.validate(%s, %r)' % (errs, warns, w.bind(self), var, required))
+        w.line(depth, 'errors.extend([%r + x for x in %s])' % (prefix, errs))
+        w.check_limit(depth)
+        w.line(depth, 'warnings.extend(%s)' % warns)
+
 
 class DictTypeChecker(FieldChecker):
     """
@@ -108,11 +282,17 @@ class DictTypeChecker(FieldChecker):
     def topLevelType(self):
         return dict
 
+    def _to_jsonschema(self, required=False):
+        return {'type': 'object',
+                'propertyNames': _value_schema(self.expectedKeyTypeInstance, required),
+                'additionalProperties': _value_schema(self.expectedValueTypeInstance, required)}
+
     def _check_field(self, fieldName, candidateField, expectedValue, errors, warngings, required):
         if isinstance(expectedValue, FieldChecker):
-            errorString = 'Found error in ' + fieldName + ' "' + unicode(candidateField) + '": '
-            errors.extend(errorString + x for x in 
-                          expectedValue.validate(candidateField))
+            errorString = 'Found error in %s "%s": ' % (fieldName, candidateField)
+            errs, warns = expectedValue.validate(candidateField, required)
+            errors.extend([errorString + x for x in errs])
+            warngings.extend(warns)
                               
         elif not isinstance(candidateField, type(expectedValue)):
             #csv reader reads this as strings, try to convert to an int
@@ -120,26 +300,23 @@ class DictTypeChecker(FieldChecker):
                 try:
                     int(candidateField)
                 except (TypeError, ValueError) as e:
-                    errors.append(
-                        fieldName + ' "' + unicode(candidateField) + '" had incorrect type. ' + 
-                        'Expected: "int" but found: "' +  type(candidateField).__name__ + '"')
+                    errors.append('%s "%s" had incorrect type. Expected: "int" but found: "%s"' %
+                                  (fieldName, candidateField, type(candidateField).__name__))
             else:
-                errors.append(
-                    fieldName + ' "' + unicode(candidateField) + '" had incorrect type. ' + 
-                    'Expected: "' + 
-                    type(expectedValue).__name__ + '" ' + 
-                    'but found: "' + 
-                    type(candidateField).__name__ + '"')
+                errors.append('%s "%s" had incorrect type. Expected: "%s" but found: "%s"' %
+                              (fieldName, candidateField,
+                               type(expectedValue).__name__, type(candidateField).__name__))
                         
-        if required and not valid_entry(candidateField):
-           warngings.append('"'+ fieldName +'" was required, but found an invalid entry of "' + unicode(candidateField)+ '"')
+        if required:
+            if not valid_entry(candidateField):
+                warngings.append(REQUIRED_WARNING % (fieldName, candidateField))
                     
     def _validate(self, candidateDict, required=False):
         assert isinstance(candidateDict, self.topLevelType())
         errors = []
         warnings = []
 
-        for key, value in candidateDict.iteritems():
+        for key, value in candidateDict.items():
             self._check_field("key", key, self.expectedKeyTypeInstance, errors, warnings, required)
             self._check_field("value", value, self.expectedValueTypeInstance, errors, warnings, required)
 
@@ -159,7 +336,15 @@ class StringListChecker(FieldChecker):
         
 
     def topLevelType(self):
-        return unicode
+        return str
+
+    def _to_jsonschema(self, required=False):
+        return {'type': 'string', 'enum': list(self.fields)}
+
+    def _emit(self, w, var, prefix, required, depth):
+        depth = self._emit_type_check(w, var, prefix, depth)
+        w.line(depth, 'if not %s in %s:' % (var, w.bind(self.fields)))
+        w.error(depth + 1, prefix, 'Element "%s' + ('" was not in list %r ' % self.fields).replace('%', '%%'), var)
     
     def _validate(self, candidate, required=False):
         assert isinstance(candidate, self.topLevelType())
@@ -167,8 +352,7 @@ class StringListChecker(FieldChecker):
         warnings = []
         
         if not candidate in self.fields:
-            errors.append(
-                'Element "' + candidate + '" was not in list %r ' % self.fields)
+            errors.append('Element "%s" was not in list %r ' % (candidate, self.fields))
 
         return errors, warnings
 
@@ -194,6 +378,24 @@ class ListTypeChecker(FieldChecker):
 
     def topLevelType(self):
         return list
+
+    def _to_jsonschema(self, required=False):
+        elementRequired = required and isinstance(self.expectedTypeInstance, FieldChecker)
+        return {'type': 'array',
+                'items': _value_schema(self.expectedTypeInstance, elementRequired)}
+
+    def _emit(self, w, var, prefix, required, depth):
+        if isinstance(self.expectedTypeInstance, FieldChecker):
+            return super(ListTypeChecker, self)._emit(w, var, prefix, required, depth)
+
+        depth = self._emit_type_check(w, var, prefix, depth)
+        pos, elem = w.local('pos'), w.local('elem')
+        w.line(depth, 'for %s, %s in enumerate(%s):' % (pos, elem, var))
+        w.line(depth + 1, 'if not isinstance(%s, %s):' % (elem, w.bind(type(self.expectedTypeInstance))))
+        w.error(depth + 2, prefix,
+                'Element at index %d had incorrect type. Expected: "' +
+                type(self.expectedTypeInstance).__name__ + '" but found: "%s"',
+                pos, 'type(%s).__name__' % elem)
     
     def _validate(self, candidateList, required=False):
         assert isinstance(candidateList, self.topLevelType())
@@ -203,18 +405,14 @@ class ListTypeChecker(FieldChecker):
         
         for pos, elem in enumerate(candidateList):
             if isinstance(self.expectedTypeInstance, FieldChecker):
-                errorString = 'Found error in element at index ' + str(pos) + ': '
+                errorString = 'Found error in element at index %d: ' % pos
                 errs, warns = self.expectedTypeInstance.validate(elem, required)
-                errors.extend(errorString + x for x in errs)
-                warnings.extend(x for x in warns)
+                errors.extend([errorString + x for x in errs])
+                warnings.extend(warns)
 
             elif not isinstance(elem, type(self.expectedTypeInstance)):
-                errors.append(
-                    'Element at index ' + str(pos) + ' had incorrect type. ' +
-                    'Expected: "' +
-                     type(self.expectedTypeInstance).__name__ + '" ' + 
-                    'but found: "' + 
-                    type(elem).__name__ + '"')
+                errors.append('Element at index %d had incorrect type. Expected: "%s" but found: "%s"' %
+                              (pos, type(self.expectedTypeInstance).__name__, type(elem).__name__))
 
         return errors, warnings
 
@@ -235,15 +433,50 @@ class DictFieldChecker(FieldChecker):
         self.all_required = False
 
         self.optional_dict = dict([(x.name, x) for x in historical + optional])
+        self._required_names = frozenset(x.name for x in required)
+        self._disallow_pairs = [(x.name, x.disallowedSet)
+                                for x in required + optional + historical if x.disallowedFields]
+        self._compiled = None
+
+        # the schema doesn't change, so neither does its string form
+        self._sorted_required = sorted(self.required, key=lambda x: x.name)
+        self._sorted_optional = sorted(self.optional, key=lambda x: x.name)
+        self._str_cache = {}
+
+    def __getstate__(self):
+        # the compiled validator can't be pickled; it's rebuilt when needed
+        state = self.__dict__.copy()
+        state['_compiled'] = None
+        return state
 
     def topLevelType(self):
         return dict
 
+    def _to_jsonschema(self, required=False):
+        properties = {}
+        for field in self.historical + self.optional:
+            properties[field.name] = _value_schema(field.expectedValue, False)
+        for field in self.required:
+            properties[field.name] = _value_schema(field.expectedValue, True)
+
+        schema = {'type': 'object',
+                  'properties': properties,
+                  'additionalProperties': False}
+        if self.required:
+            schema['required'] = [x.name for x in self.required]
+
+        disallowed = [{'not': {'required': [field.name, unallowed]}}
+                      for field in self.required + self.historical + self.optional
+                      for unallowed in field.disallowedFields]
+        if disallowed:
+            schema['allOf'] = disallowed
+        return schema
+
     ######### Stringification ##########
     
     def _stringify_fields(self, items, required, indent):
         retVal = ''
-        for field in sorted(items, key=lambda x: x.name):
+        for field in items:
             fieldName, expectedValue = field.name, field.expectedValue
 
             typeName = type(expectedValue).__name__ \
@@ -260,156 +493,377 @@ class DictFieldChecker(FieldChecker):
         return retVal
                 
     def stringify(self, indent=1):
+        if indent in self._str_cache:
+            return self._str_cache[indent]
+
         retVal = _indent('{', indent-1)
-        retVal += self._stringify_fields(self.required,
+        retVal += self._stringify_fields(self._sorted_required,
                                          True,
                                          indent)
-        retVal += self._stringify_fields(self.optional,
+        retVal += self._stringify_fields(self._sorted_optional,
                                          False,
                                          indent)
-        return retVal + _indent('} ', indent-1)
+        retVal += _indent('} ', indent-1)
+        self._str_cache[indent] = retVal
+        return retVal
                        
+    ######### Code Generation ##########
+
+    def compile(self):
+        """
+        Generate and compile a function that performs the same checks as
+        validate(candidate, required=True), with the field names and expected
+        types baked into the generated source.  The function is called as
+        f(candidate, errors, warnings[, limit]) and appends to the two lists
+        given.  Once errors holds more than limit entries it stops checking and
+        raises _ErrorLimit.  The function is also stored as self._compiled
+        """
+        w = _SourceWriter()
+        w.line(0, 'def validate(candidate, errors, warnings, limit=%d):' % sys.maxsize)
+        self._emit(w, 'candidate', '', True, 1)
+        namespace = dict(w.namespace, _ErrorLimit=_ErrorLimit)
+        exec(compile('\n'.join(w.lines) + '\n', '<schema>', 'exec'), namespace)
+        self._compiled = namespace['validate']
+        return self._compiled
+
+    def _emit_field(self, w, value, field, prefix, required, depth):
+        expectedValue = field.expectedValue
+        if isinstance(expectedValue, FieldChecker):
+            expectedValue._emit(w, value, prefix + 'Found error in field "' + field.name + '": ',
+                                required, depth)
+
+        elif field.expectedType == int:
+            #csv reader reads this as strings, try to convert to an int
+            w.line(depth, 'if not isinstance(%s, int):' % value)
+            w.line(depth + 1, 'try:')
+            w.line(depth + 2, 'int(%s)' % value)
+            w.line(depth + 1, 'except (TypeError, ValueError):')
+            w.error(depth + 2, prefix, field.typeErrorPrefix, 'type(%s).__name__' % value)
+        else:
+            w.line(depth, 'if not isinstance(%s, %s):' % (value, w.bind(field.expectedType)))
+            w.error(depth + 1, prefix, field.typeErrorPrefix, 'type(%s).__name__' % value)
+
+        if required:
+            w.line(depth, 'if not %s(%s):' % (w.bind(valid_entry), value))
+            w.warning(depth + 1, REQUIRED_WARNING, repr(field.name), value)
+
+    def _emit(self, w, var, prefix, required, depth):
+        depth = self._emit_type_check(w, var, prefix, depth)
+
+        # required fields, in order
+        for field in self.required:
+            value = w.local('value')
+            w.line(depth, 'if not %r in %s:' % (field.name, var))
+            w.error(depth + 1, prefix, 'Did not find required field "' + field.name + '"')
+            w.line(depth, 'else:')
+            w.line(depth + 1, '%s = %s[%r]' % (value, var, field.name))
+            self._emit_field(w, value, field, prefix, True, depth + 1)
+
+        # everything else must be a known optional field.  Skip the loop
+        # entirely when there are only required fields
+        key = w.local('key')
+        loopDepth = depth
+        if self.required:
+            requiredNames = w.bind(self._required_names)
+            w.line(depth, 'if not %s.issuperset(%s):' % (requiredNames, var))
+            loopDepth += 1
+        w.line(loopDepth, 'for %s in %s:' % (key, var))
+        if self.required:
+            w.line(loopDepth + 1, 'if %s in %s:' % (key, requiredNames))
+            w.line(loopDepth + 2, 'continue')
+        branch = 'if'
+        for fieldName, field in sorted(self.optional_dict.items()):
+            value = w.local('value')
+            w.line(loopDepth + 1, '%s %s == %r:' % (branch, key, fieldName))
+            w.line(loopDepth + 2, '%s = %s[%s]' % (value, var, key))
+            self._emit_field(w, value, field, prefix, False, loopDepth + 2)
+            branch = 'elif'
+        if self.optional_dict:
+            w.line(loopDepth + 1, 'else:')
+            w.error(loopDepth + 2, prefix, 'Unexpected field "%s" found.', key)
+        else:
+            w.error(loopDepth + 1, prefix, 'Unexpected field "%s" found.', key)
+
+        # fields that can't be used together
+        for fieldName, disallowedSet in self._disallow_pairs:
+            w.line(depth, 'if %r in %s and not %s.isdisjoint(%s):' %
+                   (fieldName, var, w.bind(disallowedSet), var))
+            for unallowed in sorted(disallowedSet):
+                w.line(depth + 1, 'if %r in %s:' % (unallowed, var))
+                w.error(depth + 2, prefix,
+                        "Fields '%s' and '%s' are not allowed to be attached to the same entity." %
+                        (fieldName, unallowed))
+
     ######### Field Checking ##########
     
-    def _type_error(self, fieldName, expectedItem, actualItem):
-        return 'Field "' + fieldName + '" had incorrect type. ' \
-            'Expected: "' + type(expectedItem).__name__ + '" ' \
-            'but found: "' + type(actualItem).__name__ + '"'
-        
-    def _check_field(self, fieldName, candidateField, validationField, candidateFields, errors, warnings, required):
+    def _check_field(self, fieldName, candidateField, validationField, errors, warnings, required):
         expectedValue = validationField.expectedValue
         if isinstance(expectedValue, FieldChecker):
-            errorString = 'Found error in field "' + fieldName + '": '
+            errorString = 'Found error in field "%s": ' % fieldName
             errs, warns = expectedValue.validate(candidateField, required)
-            errors.extend(
-                errorString + x for x in errs)
-            warnings.extend(x for x in warns)
+            errors.extend([errorString + x for x in errs])
+            warnings.extend(warns)
             
-        elif not isinstance(candidateField, type(expectedValue)):
-             #csv reader reads this as strings, try to convert to an int
-            if type(expectedValue) == int:
-                try:
-                    int(candidateField)   
-                except (TypeError, ValueError) as e:                 
-                    errors.append(self._type_error(fieldName, int(), candidateField))
-            else:
-                errors.append(self._type_error(fieldName,
-                                               expectedValue,
-                                               candidateField))
-        if required and not valid_entry(candidateField):
-            warnings.append('"'+ fieldName +'" was required, but found an invalid entry of "' + unicode(candidateField)+ '"')
-        
-        for unallowed in validationField.disallowedFields:
-            if unallowed in candidateFields:
-                errors.append("Fields '%s' and '%s' are not allowed to be attached to the same entity." % 
-                    (validationField.name, unallowed))
+        elif not validationField.checker(candidateField):
+            errors.append(validationField.typeErrorPrefix % type(candidateField).__name__)
+        if required:
+            if not valid_entry(candidateField):
+                warnings.append(REQUIRED_WARNING % (fieldName, candidateField))
 
     def _validate(self, originalCandidate, required=False):
         assert isinstance(originalCandidate, self.topLevelType())
         errors = []
         warnings = []
 
-        candidate = originalCandidate.copy()
-        candidate_fields = originalCandidate.keys()
-
         # first, process all required fields
+        requiredFound = 0
         for field in self.required:
             fieldName = field.name
-            if not fieldName in candidate:
-                errors.append('Did not find required field "' + fieldName + '"')
+            if not fieldName in originalCandidate:
+                errors.append('Did not find required field "%s"' % fieldName)
                 continue
 
-            candidateField = candidate.pop(fieldName) 
-            self._check_field(fieldName, candidateField, field, candidate_fields, errors, warnings, True)
-
-        # at this point, all required fields have been removed
-        # iterate through remaining fields, ensuring that everything
-        # that is left is a valid optional field
-        for fieldName, expectedValue in candidate.items():
-            if fieldName in self.optional_dict.keys():
-                self._check_field(fieldName,
-                              candidate[fieldName],
-                              self.optional_dict[fieldName],
-                              candidate_fields,
-                              errors, warnings, False)
+            requiredFound += 1
+            self._check_field(fieldName, originalCandidate[fieldName], field, errors, warnings, True)
+
+        # if there is anything besides the required fields, ensure that
+        # everything else is a valid optional field
+        if requiredFound < len(originalCandidate):
+            for fieldName, candidateField in originalCandidate.items():
+                if fieldName in self._required_names:
+                    continue
+                if fieldName in self.optional_dict:
+                    self._check_field(fieldName,
+                                  candidateField,
+                                  self.optional_dict[fieldName],
+                                  errors, warnings, False)
+                else:
+                    errors.append('Unexpected field "%s" found.' % fieldName)
+
+        # finally, check for fields that can't be used together
+        if self._disallow_pairs:
+            candidate_fields = frozenset(originalCandidate)
+            for fieldName, disallowedSet in self._disallow_pairs:
+                if fieldName in candidate_fields:
+                    for unallowed in sorted(disallowedSet & candidate_fields):
+                        errors.append("Fields '%s' and '%s' are not allowed to be attached to the same entity." %
+                            (fieldName, unallowed))
+
+        return errors, warnings
+
+def _format_error(error):
+    """
+    Format an error recorded by _validateFile() for printing
+    """
+    template, lineNumber, detail = error
+    if isinstance(detail, list):
+        detail = '\n\t'.join(detail)
+    return template % (lineNumber, detail)
+
+def _native_validator(ingestion_fields):
+    """
+    Return a jsonschema_rs validator for ingestion_fields, or None if
+    jsonschema_rs is not installed
+    """
+    if jsonschema_rs is None:
+        return None
+    return jsonschema_rs.Draft7Validator(ingestion_fields._to_jsonschema(True))
+
+def _make_validator(ingestion_fields, lineLimit):
+    """
+    Return the (compiled validator, native is_valid or None, lineLimit) used
+    by _check_lines()
+    """
+    validate = ingestion_fields._compiled or ingestion_fields.compile()
+    native = _native_validator(ingestion_fields)
+    is_valid = native.is_valid if native is not None else None
+    return validate, is_valid, lineLimit
+
+# set in each worker process by _init_worker()
+_GLOBAL_VALIDATOR = None
+
+def _init_worker(ingestion_fields, lineLimit):
+    global _GLOBAL_VALIDATOR
+    _GLOBAL_VALIDATOR = _make_validator(ingestion_fields, lineLimit)
+
+def _check_lines(validator, lines, start=0):
+    """
+    Check each of lines, numbering them from start, using a validator from
+    _make_validator().  Yield, for each line, None if it is valid or else a
+    tuple of (error or None, warnings)
+    """
+    validate, is_valid, lineLimit = validator
+    loads = json.loads
+    for lineCount, line in enumerate(lines, start):
+        try:
+            # lines are raw bytes; the parser decodes the UTF-8 itself
+            candidate = loads(line)
+        except UnicodeDecodeError as e:
+            yield (INVALID_UTF8_ERROR, lineCount + 1, str(e)), []
+            continue
+        except ValueError as e:
+            # orjson reports bad UTF-8 as a JSON error, so check for it here
+            try:
+                line.decode('utf-8')
+            except UnicodeDecodeError as decodeError:
+                yield (INVALID_UTF8_ERROR, lineCount + 1, str(decodeError)), []
             else:
-                errors.append('Unexpected field "' + fieldName + '" found.')
+                yield (INVALID_JSON_ERROR, lineCount + 1, str(e)), []
+            continue
+
+        # anything the native validator accepts has no errors or warnings;
+        # everything else is run through the checkers to describe what's wrong
+        if is_valid is not None:
+            try:
+                known_valid = is_valid(candidate)
+            except Exception:
+                # e.g. strings holding lone surrogates, which jsonschema_rs
+                # can't encode; leave those to the checkers
+                known_valid = False
+            if known_valid:
+                yield None
                 continue
 
+        validateErrors, warns = [], []
+        try:
+            validate(candidate, validateErrors, warns, lineLimit)
+        except _ErrorLimit:
+            # a single line with more errors than we'll report; don't bother
+            # finding the rest of them
+            del validateErrors[lineLimit:]
+            validateErrors.append(MORE_ERRORS_NOTE)
+
+        if validateErrors:
+            yield (SCHEMA_ERROR, lineCount + 1, validateErrors), warns
+        elif warns:
+            yield None, warns
+        else:
+            yield None
 
-        return errors, warnings
+def _validate_block(block):
+    """
+    Check a block of lines, given as (index of the first line, lines), in a
+    worker process set up by _init_worker().  Return the index of the first
+    line and a list of what _check_lines() yields for them
+    """
+    start, lines = block
+    return start, list(_check_lines(_GLOBAL_VALIDATOR, lines, start))
+
+def _read_blocks(reader, size=BLOCK_SIZE):
+    """
+    Group the lines from reader into blocks of (index of the first line, lines)
+    """
+    start = 0
+    while True:
+        lines = list(itertools.islice(reader, size))
+        if not lines:
+            return
+        yield start, lines
+        start += len(lines)
 
-def _validateFile(input_file, ingestion_fields, max_errors = -1, ):
-    errors = []
-    warnings = []
+def _ordered_results(pool, func, iterable, window):
+    """
+    Like pool.imap(func, iterable), but with no more than window items
+    submitted ahead of the one being waited on, so iterable isn't read
+    any faster than the results are used
+    """
+    pending = collections.deque()
+    for item in iterable:
+        pending.append(pool.apply_async(func, (item,)))
+        if len(pending) >= window:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+def _validateFile(input_file, ingestion_fields, max_errors = -1, processes=1, output=None):
+    """
+    Check each line of input_file against ingestion_fields.  By default
+    everything is done in this process; with processes > 1 the lines are
+    checked by a pool of that many worker processes.  Errors and warnings
+    are written to output (by default, stdout) as they are found.  Return the
+    number of errors, the number of warnings, the number of lines checked,
+    and whether checking stopped before the end of the file
+    """
+    if output is None:
+        output = sys.stdout
+    errorCount = 0
+    warningCount = 0
     lineCount = 0
     stoppedEarly = False
+    lineLimit = max_errors if max_errors > 0 else sys.maxsize
     reader = safe_file_reader(input_file)
+
+    pool = None
+    if processes == 1:
+        # one lazy block, so nothing past the error limit is checked
+        validator = _make_validator(ingestion_fields, lineLimit)
+        results = [(0, _check_lines(validator, reader))]
+    else:
+        pool = multiprocessing.Pool(processes, _init_worker, (ingestion_fields, lineLimit))
+        results = _ordered_results(pool, _validate_block, _read_blocks(reader), 2 * processes)
+
     try:
-        for lineCount, line in enumerate(reader):
+        for start, block in results:
+            for lineCount, result in enumerate(block, start):
 
-            if lineCount and not lineCount % 10000:
-                print "Processed %s lines" % lineCount
-                
-            if max_errors > 0 and len(errors) >= max_errors:
-                lineCount -= 1 # didn't actually process this line
-                stoppedEarly = True
+                if lineCount and not lineCount % 10000:
+                    print("Processed %s lines" % lineCount, file=output)
+
+                if max_errors > 0 and errorCount >= max_errors:
+                    lineCount -= 1 # didn't actually process this line
+                    stoppedEarly = True
+                    break
+
+                if result is None:
+                    continue
+
+                error, warns = result
+                if error is not None:
+                    print(_format_error(error), file=output)
+                    errorCount += 1
+
+                for warn in warns:
+                    print('line %d: warning - %s' %(lineCount, warn), file=output)
+                    warningCount += 1
+
+            if stoppedEarly:
                 break
-            try:
-                candidate = json.loads(line)
-            except ValueError, e:
-                errors.append(
-                    'Line ' + str(lineCount + 1) + ': Found invalid JSON: ' + str(e) )
-                continue
-            
-            validateErrors, warns = ingestion_fields.validate(candidate, required=True)
-            if len(validateErrors) > 0:
-                errors.append(
-                    'Line ' + str(lineCount + 1) +
-                    ': Found valid JSON which does not match expected schema:' +
-                    '\n\t' + '\n\t'.join(validateErrors))
-           
-            for warn in warns:
-                print 'line %d: warning - %s' %(lineCount, warn)
-                warnings.append(warn)
-
-
-    except UnicodeDecodeError, e:
-        errors.append(
-            'Line ' + str(lineCount + 1) +
-            ': Found invalid UTF-8 characters.  ' +
-            'Check the encoding of the input file: ' + str(e))      
-
-    return errors, warnings, lineCount + 1, stoppedEarly
+    finally:
+        if pool is not None:
+            # drop anything still queued once we've stopped early
+            pool.terminate()
+            pool.join()
+
+    return errorCount, warningCount, lineCount + 1, stoppedEarly
 
 # FieldChecker representing the expected JSON structure for a song / track ingestion
 track_fields = DictFieldChecker(
     [
-        Field('type', unicode()),
-        Field('id', unicode()),
-        Field('name', unicode()),
+        Field('type', str()),
+        Field('id', str()),
+        Field('name', str()),
         Field('artist', DictFieldChecker(
             [
-                Field('id', unicode()), 
-                Field('name', unicode()),
+                Field('id', str()), 
+                Field('name', str()),
             ],  [],  []
           )
         )
     ]
     ,
     [
-        Field('extras', DictTypeChecker(unicode(), object())),
+        Field('extras', DictTypeChecker(str(), object())),
         Field('takedown', bool()),
-        Field('regions', ListTypeChecker(unicode()), disallowedFields=['regions_add', 'regions_delete']),
-        Field('regions_add', ListTypeChecker(unicode()), disallowedFields=['regions']),
-        Field('regions_delete', ListTypeChecker(unicode()), disallowedFields=['regions']),
-        Field('ISRC', unicode()),
+        Field('regions', ListTypeChecker(str()), disallowedFields=['regions_add', 'regions_delete']),
+        Field('regions_add', ListTypeChecker(str()), disallowedFields=['regions']),
+        Field('regions_delete', ListTypeChecker(str()), disallowedFields=['regions']),
+        Field('ISRC', str()),
         Field('release_year', int()),
-        Field('audio_url', unicode()),
+        Field('audio_url', str()),
         Field('release', DictFieldChecker(
             [ 
-                Field('id', unicode()),
-                Field('name', unicode()) 
+                Field('id', str()),
+                Field('name', str()) 
             ],
             [  
                 Field('release_year', int())
@@ -426,15 +880,15 @@ track_fields = DictFieldChecker(
 # FieldChecker representing the expected JSON structure for an artist ingestion
 artist_fields = DictFieldChecker(
     [
-        Field('id', unicode()),
-        Field('name', unicode()),
+        Field('id', str()),
+        Field('name', str()),
     ]
     ,
     [
-        Field('extras', DictTypeChecker(unicode(), object())),
-        Field('regions', ListTypeChecker(unicode()), disallowedFields=['regions_add', 'regions_delete']),
-        Field('regions_add', ListTypeChecker(unicode()), disallowedFields=['regions']),
-        Field('regions_delete', ListTypeChecker(unicode()), disallowedFields=['regions']),
+        Field('extras', DictTypeChecker(str(), object())),
+        Field('regions', ListTypeChecker(str()), disallowedFields=['regions_add', 'regions_delete']),
+        Field('regions_add', ListTypeChecker(str()), disallowedFields=['regions']),
+        Field('regions_delete', ListTypeChecker(str()), disallowedFields=['regions']),
         Field('takedown', bool()),
     ]
     ,
@@ -465,7 +919,9 @@ The expected and required fields for "artist" as follows:
 
     parser = OptionParser(usage=usage)
     parser.add_option('-m', '--max_errors', dest='max_errors', action="store", type="int", default=1000,
-        help="optional integer argument specifying maximum number of errors to be reported. Default is to report first 1000 errors.  Passing -1 will report all errors.")    
+        help="optional integer argument specifying maximum number of errors to be reported. Default is to report first 1000 errors.  Each line reports at most this many problems too; the rest are left out.  Passing -1 will report all errors.")    
+    parser.add_option('-j', '--jobs', dest='processes', action="store", type="int", default=multiprocessing.cpu_count(),
+        help="optional integer argument specifying the number of processes used to check the file. Default is one per CPU.  Passing 1 checks the file without starting any other processes.")
     
     options, args = parser.parse_args()
 
@@ -478,36 +934,41 @@ The expected and required fields for "artist" as follows:
         parser.error('unable to parse "%s" please proide either "artist" or "track" as the type')
 
     maxErrors = options.max_errors
+    if options.processes < 1:
+        parser.error('the number of jobs must be at least 1')
 
     try:
-        inputFile = codecs.open(filename, 'r', encoding='utf-8')
-    except IOError, e:
+        # unbuffered: safe_file_reader() already reads in large chunks
+        inputFile = open(filename, 'rb', 0)
+    except IOError as e:
         parser.error( 'Can\'t open file: "' + filename + '" for reason: ' + e.strerror )
 
     fields = track_fields if typer =='track' else artist_fields
 
-    allErrors, allWarns, count, stoppedEarly = _validateFile(inputFile, fields, maxErrors)
+    # reported values can hold lone surrogates (from \ud800-style escapes),
+    # which can't be encoded as-is
+    sys.stdout.reconfigure(errors='backslashreplace')
+
+    errorCount, warningCount, count, stoppedEarly = _validateFile(inputFile, fields, maxErrors,
+                                                                  options.processes)
 
     def _plural(num, value):
         return value + ('s' if num != 1 else '')
 
-    for err in allErrors:
-        print err
-
     if stoppedEarly:
-        print '\n*** WARNING ***: Error limit reached.  Did not check all lines.  ' \
-              'See usage to increase number of reported errors'
+        print('\n*** WARNING ***: Error limit reached.  Did not check all lines.  '
+              'See usage to increase number of reported errors')
 
-    print '\nChecked ' + str(count) + ' ' + _plural(count, 'line') + ', ' + \
-        'found ' + _plural(len(allErrors), 'error') + \
-        ' on ' + str(len(allErrors)) + \
-        ' ' + _plural(len(allErrors), 'line') + ' and found ' + \
-         _plural(len(allWarns), 'warning') + ' on ' + str(len(allWarns)) + ' lines'
+    print('\nChecked ' + str(count) + ' ' + _plural(count, 'line') + ', ' +
+        'found ' + _plural(errorCount, 'error') +
+        ' on ' + str(errorCount) +
+        ' ' + _plural(errorCount, 'line') + ' and found ' +
+         _plural(warningCount, 'warning') + ' on ' + str(warningCount) + ' lines')
 
-    if not allErrors:
-        print '\nFile is valid to send to The Echo Nest'
+    if not errorCount:
+        print('\nFile is valid to send to The Echo Nest')
 
-    print
+    print()
 
 if __name__ == '__main__':
     main()
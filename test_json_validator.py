@@ -0,0 +1,170 @@
+"""
+Tests for json_validator_v1.0.0.6.py.  Run with: python -m unittest
+"""
+import importlib.util
+import io
+import multiprocessing
+import os
+import sys
+import unittest
+
+# the script's file name isn't importable as-is
+_spec = importlib.util.spec_from_file_location(
+    'json_validator', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'json_validator_v1.0.0.6.py'))
+jv = importlib.util.module_from_spec(_spec)
+sys.modules['json_validator'] = jv
+_spec.loader.exec_module(jv)
+
+
+VALID_ARTIST = {'id': 'A1', 'name': 'Artist'}
+VALID_TRACK = {'type': 'track', 'id': 'T1', 'name': 'Song', 'artist': dict(VALID_ARTIST)}
+
+# values tried in every field, covering each type and the blank strings
+VALUES = [None, True, False, 0, 1, 1.5, '1999', '19x9', 'x', '', ' ', '\t\n', '\x1c', '\x85',
+          '\xa0', '\u2028', '\u3000', ' x ', [], ['a'], [1], ['', ' '], {}, {'a': 1},
+          {'id': 'R1', 'name': 'Release'}, {'id': ' ', 'name': 'Release'},
+          {'id': 'R1', 'name': 'Release', 'release_year': 'x'}]
+
+ARTIST_NAMES = ['id', 'name', 'extras', 'regions', 'regions_add', 'regions_delete',
+                'takedown', 'published', 'bogus']
+TRACK_NAMES = ARTIST_NAMES + ['type', 'artist', 'ISRC', 'release_year', 'audio_url', 'release']
+
+
+def candidates(valid, names, nested=()):
+    """
+    Yield valid along with variations of it: each field dropped, each field
+    set to each of VALUES (also inside the nested dict fields), disallowed
+    pairs, and values that aren't dicts at all
+    """
+    yield valid
+    for name in valid:
+        candidate = dict(valid)
+        del candidate[name]
+        yield candidate
+    for name in names:
+        for value in VALUES:
+            yield dict(valid, **{name: value})
+    for name in nested:
+        for key in ('id', 'name', 'release_year', 'bogus'):
+            for value in VALUES:
+                inner = dict(VALID_ARTIST, **{key: value})
+                yield dict(valid, **{name: inner})
+    yield dict(valid, regions=['US'], regions_add=['CA'])
+    yield dict(valid, regions=['US'], regions_add=['CA'], regions_delete=['MX'])
+    yield dict(valid, regions_add=['CA'], regions_delete=['MX'], published=True)
+    for value in ([], 'x', 1, None):
+        yield value
+
+
+class CheckerTests(unittest.TestCase):
+
+    def cases(self):
+        return [(jv.artist_fields, list(candidates(VALID_ARTIST, ARTIST_NAMES))),
+                (jv.track_fields, list(candidates(VALID_TRACK, TRACK_NAMES, ('artist', 'release'))))]
+
+    def test_compiled_matches_validate(self):
+        for fields, candidates in self.cases():
+            validate = fields.compile()
+            for candidate in candidates:
+                errors, warnings = [], []
+                validate(candidate, errors, warnings)
+                self.assertEqual((errors, warnings), tuple(fields.validate(candidate, required=True)),
+                                 candidate)
+
+    def test_compiled_error_limit(self):
+        validate = jv.track_fields.compile()
+        candidate = {'bogus1': 1, 'bogus2': 2}
+        expected, _ = jv.track_fields.validate(candidate, required=True)
+
+        # exactly limit errors are all reported
+        errors = []
+        validate(candidate, errors, [], len(expected))
+        self.assertEqual(errors, expected)
+
+        errors = []
+        with self.assertRaises(jv._ErrorLimit):
+            validate(candidate, errors, [], len(expected) - 1)
+
+    @unittest.skipIf(jv.jsonschema_rs is None, 'jsonschema_rs is not installed')
+    def test_jsonschema_accepts_nothing_the_checkers_flag(self):
+        for fields, candidates in self.cases():
+            native = jv._native_validator(fields)
+            self.assertTrue(native.is_valid(candidates[0]))
+            for candidate in candidates:
+                if native.is_valid(candidate):
+                    self.assertEqual(tuple(fields.validate(candidate, required=True)), ([], []),
+                                     candidate)
+
+    @unittest.skipIf(jv.jsonschema_rs is None, 'jsonschema_rs is not installed')
+    def test_non_blank_pattern_rejects_whitespace(self):
+        nonBlank = jv.jsonschema_rs.Draft7Validator({'pattern': jv.NON_BLANK_PATTERN})
+        blank = [c for c in map(chr, range(sys.maxunicode + 1))
+                 if c.isspace() and nonBlank.is_valid(c)]
+        self.assertEqual(blank, [])
+        self.assertTrue(nonBlank.is_valid(' x '))
+
+
+class ReaderTests(unittest.TestCase):
+
+    def test_chunk_stitching(self):
+        lines = [b'{"a": 1}', b'', b'x' * 37, '{"b": " \xe9"}'.encode('utf-8'), b'', b'last']
+        for data in (b'\n'.join(lines), b'\n'.join(lines) + b'\n', b'\n'.join(lines) + b'\n\n'):
+            expected = data.split(b'\n')
+            if not expected[-1]:
+                expected.pop()
+            for chunkSize in list(range(1, 24)) + [jv.READ_CHUNK_SIZE]:
+                self.assertEqual(list(jv.safe_file_reader(io.BytesIO(data), chunkSize)), expected,
+                                 (data, chunkSize))
+
+    def test_empty_file(self):
+        self.assertEqual(list(jv.safe_file_reader(io.BytesIO(b''))), [])
+
+
+class ValidateFileTests(unittest.TestCase):
+
+    lines = [b'{"id": "a", "name": "b"}',
+             b'{"id": "a", "name": " "}',
+             b'{"id": 1}',
+             b'not json',
+             b'{"id": "\xff"}',
+             b'{"bogus1": 1, "bogus2": 2, "bogus3": 3}'] * 3
+
+    def run_file(self, max_errors=-1, processes=1):
+        output = io.StringIO()
+        data = io.BytesIO(b'\n'.join(self.lines) + b'\n')
+        result = jv._validateFile(data, jv.artist_fields, max_errors, processes, output)
+        return result, output.getvalue()
+
+    def test_counts(self):
+        result, output = self.run_file()
+        self.assertEqual(result, (12, 3, 18, False))
+        self.assertIn('Line 5: Found invalid UTF-8 characters.', output)
+        self.assertIn('Line 4: Found invalid JSON:', output)
+
+    # other start methods import the script afresh by a name it doesn't have
+    @unittest.skipUnless(multiprocessing.get_start_method() == 'fork', 'workers need fork')
+    def test_pool_matches_in_process(self):
+        self.assertEqual(self.run_file(processes=2), self.run_file())
+        self.assertEqual(self.run_file(5, processes=2), self.run_file(5))
+
+    def test_max_errors(self):
+        (errors, _, count, stoppedEarly), output = self.run_file(3)
+        self.assertEqual((errors, count, stoppedEarly), (3, 5, True))
+
+        # a line with more messages than max_errors is cut short, but
+        # doesn't stop the run on its own
+        self.lines = [b'{"bogus1": 1, "bogus2": 2, "bogus3": 3}']
+        (errors, _, count, stoppedEarly), output = self.run_file(1)
+        self.assertEqual((errors, count, stoppedEarly), (1, 1, False))
+        self.assertIn(jv.MORE_ERRORS_NOTE, output)
+
+    def test_native_validator_failure_falls_back(self):
+        def is_valid(candidate):
+            raise UnicodeEncodeError('utf-8', '\ud800', 0, 1, 'surrogates not allowed')
+        validate, _, lineLimit = jv._make_validator(jv.artist_fields, sys.maxsize)
+        results = list(jv._check_lines((validate, is_valid, lineLimit), self.lines[:2]))
+        self.assertEqual(results, [None, (None, [jv.REQUIRED_WARNING % ('name', ' ')])])
+
+
+if __name__ == '__main__':
+    unittest.main()